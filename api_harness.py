@@ -1,15 +1,17 @@
-import os, requests, time
-from requests.adapters import HTTPAdapter
+import os, time, requests
 from urllib3.util.retry import Retry
+# Note: importing coinalyze_api resolves and caches the API host (patching
+# socket.getaddrinfo), applies its TLS minimum, and needs API_KEY/API_KEYS set.
+import coinalyze_api
 
 BASE_URL = "https://api.coinalyze.net/v1/exchanges"
 API_KEY  = os.getenv("API_KEY")
 
+# Own retry policy (429/5xx, 5 tries) on an adapter built with coinalyze_api's
+# TLS context and socket options.
 session = requests.Session()
-retries = Retry(total=5, backoff_factor=0.8,
-                status_forcelist=[429, 500, 502, 503, 504],
-                allowed_methods=["GET"])
-session.mount("https://", HTTPAdapter(max_retries=retries))
+session.mount("https://", coinalyze_api.make_adapter(
+    Retry(total=5, backoff_factor=0.8, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])))
 
 HEADERS = {
     "Authorization": f"Bearer {API_KEY}",
@@ -1,6 +1,9 @@
 import os, time, requests
-from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib3.util.retry import Retry
+# Note: importing coinalyze_api resolves and caches the API host (patching
+# socket.getaddrinfo), applies its TLS minimum, and needs API_KEY/API_KEYS set.
+import coinalyze_api
 
 API_KEY = os.getenv("API_KEY")
 HEADERS = {
@@ -9,11 +12,12 @@ HEADERS = {
     "User-Agent": "alphaops-polymerize/1.0"
 }
 
+# Own retry policy (429/5xx, 5 tries) on an adapter built with coinalyze_api's
+# TLS context and socket options.
 session = requests.Session()
-retries = Retry(total=5, backoff_factor=0.8,
-                status_forcelist=[429,500,502,503,504],
-                allowed_methods=["GET"])
-session.mount("https://", HTTPAdapter(max_retries=retries))
+session.mount("https://", coinalyze_api.make_adapter(
+    Retry(total=5, backoff_factor=0.8, status_forcelist=[429,500,502,503,504], allowed_methods=["GET"]),
+    pool_connections=8, pool_maxsize=8))
 
 ENDPOINTS = {
     "exchanges": "https://api.coinalyze.net/v1/exchanges",
@@ -30,12 +34,16 @@ def fetch(name, url, params=None):
 if __name__ == "__main__":
     t0 = time.time()
     results = {}
-    for name, url in ENDPOINTS.items():
-        try:
-            n, data = fetch(name, url)
-            results[n] = data
-            print(f"✅ {n}: {len(data)} items")
-            print("Sample:", data[:3])
-        except Exception as e:
-            print(f"❌ {name} failed:", repr(e))
+    # endpoints are independent -> fire them together, wall time ~ slowest call
+    with ThreadPoolExecutor(max_workers=len(ENDPOINTS)) as ex:
+        futs = {ex.submit(fetch, name, url): name for name, url in ENDPOINTS.items()}
+        for fut in as_completed(futs):
+            name = futs[fut]
+            try:
+                n, data = fut.result()
+                results[n] = data
+                print(f"✅ {n}: {len(data)} items")
+                print("Sample:", data[:3])
+            except Exception as e:
+                print(f"❌ {name} failed:", repr(e))
     print("\nCompleted in", round(time.time()-t0,2), "s")
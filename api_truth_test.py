@@ -1,8 +1,12 @@
-import os, time, socket, ssl, requests
+import os, time, socket, ssl, threading, requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 
 BASE_HOST = os.getenv("BASE_HOST", "api.coinalyze.net").strip().replace("https://","").replace("http://","").split("/")[0]
 API_KEY   = os.getenv("API_KEY", "")
 TIMEOUT   = float(os.getenv("TIMEOUT", "15"))
+PROBE_WORKERS = int(os.getenv("PROBE_WORKERS", "8"))
+PROBE_TLS = os.getenv("PROBE_TLS", "0") == "1"  # raw DNS/TLS diagnostics cost an extra handshake
 
 # Candidate endpoint paths to try (lightweight first)
 CANDIDATE_PATHS = [
@@ -20,43 +24,65 @@ CANDIDATE_PATHS = [
 
 UA = "alphaops-polymerize/1.0"
 
+# rank (position in CANDIDATE_PATHS x header order) of the best 200 so far
+_best = [float("inf")]
+_best_lock = threading.Lock()
+
+# probes share keep-alive connections instead of a fresh TCP+TLS handshake per call
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=PROBE_WORKERS))
+
 def dns_lookup(host):
     try:
         return socket.getaddrinfo(host, 443, proto=socket.IPPROTO_TCP)
     except Exception as e:
         return f"DNS error: {e}"
 
+# built once; creating a context loads the whole CA store
+SSL_CTX = ssl.create_default_context()
+
 def tls_probe(host):
-    ctx = ssl.create_default_context()
     try:
         with socket.create_connection((host, 443), timeout=5) as sock:
-            with ctx.wrap_socket(sock, server_hostname=host) as ssock:
+            with SSL_CTX.wrap_socket(sock, server_hostname=host) as ssock:
                 return {"tls_version": ssock.version(), "cipher": ssock.cipher(), "peer": ssock.getpeername()}
     except Exception as e:
         return f"TLS error: {e}"
 
-def try_call(url, headers, label):
-    print(f"\n--- {label} → {url} ---")
+def try_call(rank, url, headers, label):
+    # a better-ranked combo already answered 200 -> this one can't win, skip it
+    if rank > _best[0]:
+        return rank, label, url, None, None
+    lines = [f"\n--- {label} → {url} ---"]
     try:
-        r = requests.get(url, headers=headers, timeout=TIMEOUT)
-        print("HTTP_STATUS:", r.status_code)
+        r = session.get(url, headers=headers, timeout=TIMEOUT)
+        lines.append(f"HTTP_STATUS: {r.status_code}")
         if r.status_code == 200:
+            with _best_lock:
+                _best[0] = min(_best[0], rank)
             preview = r.text[:400].replace("\n"," ")
-            print("OK_BODY_PREVIEW:", preview + ("..." if len(r.text)>400 else ""))
-            return 200, r.text
+            lines.append("OK_BODY_PREVIEW: " + preview + ("..." if len(r.text)>400 else ""))
         else:
-            print("BODY_PREVIEW:", r.text[:200].replace("\n"," "))
-            return r.status_code, r.text
+            lines.append("BODY_PREVIEW: " + r.text[:200].replace("\n"," "))
+        if r.status_code == 401: lines.append("→ 401 = key/auth header mismatch or activation delay.")
+        if r.status_code == 403: lines.append("→ 403 = geo/ASN block (but DNS/TLS ok).")
+        return rank, label, url, r.status_code, r.text
     except requests.exceptions.RequestException as e:
-        print("REQUEST_EXCEPTION:", repr(e))
-        return -1, None
+        lines.append(f"REQUEST_EXCEPTION: {e!r}")
+        return rank, label, url, -1, None
+    finally:
+        # one print per call so concurrent workers don't interleave lines
+        print("\n".join(lines))
 
 if __name__ == "__main__":
     host = BASE_HOST
     print("=== Polymerize API Multi-Probe ===")
     print("HOST:", host)
-    print("DNS:", dns_lookup(host))
-    print("TLS:", tls_probe(host))
+    if PROBE_TLS:
+        print("DNS:", dns_lookup(host))
+        print("TLS:", tls_probe(host))
+    else:
+        print("DNS/TLS: skipped (set PROBE_TLS=1 for raw diagnostics)")
     print("Time:", time.strftime("%Y-%m-%d %H:%M:%S %Z"))
     print("------------------------------")
 
@@ -66,25 +92,23 @@ if __name__ == "__main__":
 
     winner = None
 
-    for path in CANDIDATE_PATHS:
-        url = base_url + path
-
-        # Try Bearer
-        code, _ = try_call(url, bearer_headers, "Authorization: Bearer")
-        if code == 401: print("→ 401 = key/auth header mismatch or activation delay.")
-        if code == 403: print("→ 403 = geo/ASN block (but DNS/TLS ok).")
-        if code == 200:
-            winner = ("Authorization: Bearer", url); break
-        if code == 404:
-            # Try same path with X-API-KEY before moving on
-            code2, _ = try_call(url, xkey_headers, "X-API-KEY")
-            if code2 == 200:
-                winner = ("X-API-KEY", url); break
-        else:
-            # Non-404 → try X-API-KEY anyway
-            code2, _ = try_call(url, xkey_headers, "X-API-KEY")
-            if code2 == 200:
-                winner = ("X-API-KEY", url); break
+    # every path/header combo is independent -> fan out, but the winner is the
+    # first 200 in list order (lightweight path first, Bearer before X-API-KEY),
+    # not whichever answers first, so the advice below is the same every run
+    combos = [
+        (base_url + path, headers, label)
+        for path in CANDIDATE_PATHS
+        for label, headers in (("Authorization: Bearer", bearer_headers), ("X-API-KEY", xkey_headers))
+    ]
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as ex:
+        futs = [ex.submit(try_call, rank, *combo) for rank, combo in enumerate(combos)]
+        hits = []
+        for fut in as_completed(futs):
+            rank, label, url, code, _ = fut.result()
+            if code == 200:
+                hits.append((rank, label, url))
+    if hits:
+        winner = min(hits)[1:]
 
     print("\n==============================")
     if winner:
@@ -1,8 +1,23 @@
-import os, time, itertools, requests
-from typing import Any, Dict, Optional
+import os, ssl, json, random, socket, threading, time, functools, itertools, requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Union
+from urllib.parse import urlencode, urlparse
 from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.connection import allowed_gai_family
 from urllib3.util.retry import Retry
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # stdlib fallback keeps the module importable without orjson
+    _json_loads = json.loads
+
+try:
+    import ijson
+except ImportError:  # optional: iter_ohlcv_history decodes the full body instead
+    ijson = None
+
 # ---- Keys & config ----
 _API_KEYS = [k.strip() for k in os.getenv("API_KEYS","").split(",") if k.strip()]
 if not _API_KEYS:
@@ -10,115 +25,365 @@ if not _API_KEYS:
     if not single:
         raise RuntimeError("Missing API_KEY or API_KEYS env var.")
     _API_KEYS = [single]
-_key_cycle = itertools.cycle(_API_KEYS)
+# One prebuilt header dict per key, rotated round-robin (requests copies them on merge)
+_header_cycle = itertools.cycle([
+    {
+        "Authorization": f"Bearer {k}",
+        "Accept": "application/json",
+        "User-Agent": "alphaops-coinalyze/1.2",
+    }
+    for k in _API_KEYS
+])
 
 BASE = os.getenv("COINALYZE_BASE","https://api.coinalyze.net/v1").rstrip("/")
 DEFAULT_TIMEOUT = float(os.getenv("COINALYZE_TIMEOUT","20"))
+POOL_CONNECTIONS = int(os.getenv("COINALYZE_POOL_CONNECTIONS","32"))
+POOL_MAXSIZE     = int(os.getenv("COINALYZE_POOL_MAXSIZE","64"))
+DNS_TTL          = float(os.getenv("COINALYZE_DNS_TTL","900"))  # 0 disables the cache
+MAX_WORKERS      = int(os.getenv("COINALYZE_MAX_WORKERS","8"))
+RATE_PER_MIN     = float(os.getenv("COINALYZE_RATE_PER_MIN","40"))  # per API key; 0 disables
+TLS_MIN          = os.getenv("COINALYZE_TLS_MIN","1.3")  # "1.2" for middleboxes that can't do 1.3
+DISCOVERY_TTL    = int(os.getenv("DISCOVERY_CACHE_TTL","3600"))  # 0 disables the disk cache
+# per-user by default: a fixed name in the shared temp dir could be pre-created by another user
+CACHE_DIR        = os.getenv("COINALYZE_CACHE_DIR") or os.path.join(
+    os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "coinalyze")
+
+# ---- DNS ----
+# glibc keeps no resolver cache, so every new pooled socket would pay a lookup.
+# Cache answers for the API host only; everything else goes straight through.
+_API_HOST = urlparse(BASE).hostname
+_dns_cache: Dict[tuple, tuple] = {}
+_os_getaddrinfo = socket.getaddrinfo
+
+def _cached_getaddrinfo(host, port, *args, **kwargs):
+    if host != _API_HOST or DNS_TTL <= 0:
+        return _os_getaddrinfo(host, port, *args, **kwargs)
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    now = time.monotonic()
+    hit = _dns_cache.get(key)
+    if hit and hit[0] > now:
+        return hit[1]
+    res = _os_getaddrinfo(host, port, *args, **kwargs)
+    _dns_cache[key] = (now + DNS_TTL, res)
+    return res
+
+socket.getaddrinfo = _cached_getaddrinfo
+
+def _prewarm_dns():
+    # same args urllib3 uses, so the first real connect is a cache hit
+    try:
+        socket.getaddrinfo(_API_HOST, urlparse(BASE).port or 443, allowed_gai_family(), socket.SOCK_STREAM)
+    except OSError:
+        pass  # the real request will surface resolver errors
+
+# resolve while the caller is still importing/initializing instead of on the first call
+if _API_HOST:
+    threading.Thread(target=_prewarm_dns, name="coinalyze-dns-prewarm", daemon=True).start()
+
+# ---- TLS ----
+# One context for every pooled connection: the CA bundle is parsed once here
+# instead of being reloaded by urllib3 on each new socket.
+SSL_CONTEXT = ssl.create_default_context(cafile=requests.certs.where())
+SSL_CONTEXT.minimum_version = ssl.TLSVersion.TLSv1_3 if TLS_MIN == "1.3" else ssl.TLSVersion.TLSv1_2
+
+# urllib3 already sets TCP_NODELAY; add keepalive so idle pooled sockets that a
+# NAT/LB silently dropped are detected instead of stalling the next request.
+SOCKET_OPTIONS = HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+
+class _PooledAdapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs.setdefault("ssl_context", SSL_CONTEXT)
+        kwargs.setdefault("socket_options", SOCKET_OPTIONS)
+        super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        # proxied connections to the API get the same context/options as direct ones
+        proxy_kwargs.setdefault("ssl_context", SSL_CONTEXT)
+        proxy_kwargs.setdefault("socket_options", SOCKET_OPTIONS)
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
+
+    def cert_verify(self, conn, url, verify, cert):
+        super().cert_verify(conn, url, verify, cert)
+        if verify is True:
+            # bundle already lives in SSL_CONTEXT; don't make urllib3 load it per connect
+            conn.ca_certs = None
+            conn.ca_cert_dir = None
+
+def make_adapter(retry: Retry, **pool_kwargs) -> HTTPAdapter:
+    """An adapter with this module's TLS context and socket options, for callers
+    (e.g. the harnesses) that need their own retry policy."""
+    pool_kwargs.setdefault("pool_connections", POOL_CONNECTIONS)
+    pool_kwargs.setdefault("pool_maxsize", POOL_MAXSIZE)
+    pool_kwargs.setdefault("pool_block", False)
+    return _PooledAdapter(max_retries=retry, **pool_kwargs)
 
 # ---- Session with basic retries for DNS/connection ----
+# Single host, so one real pool: keep enough warm sockets that fan-out callers
+# reuse live TLS connections instead of discarding them under load.
 session = requests.Session()
 session.mount(
     "https://",
-    HTTPAdapter(
-        max_retries=Retry(
-            total=3, backoff_factor=0.6,
-            status_forcelist=[502, 503, 504],
-            allowed_methods=["GET"],
-            raise_on_status=False,
-        )
-    ),
+    make_adapter(Retry(
+        total=3, backoff_factor=0.6,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=["GET"],
+        raise_on_status=False,
+    )),
 )
+# Resolve environment settings once: with trust_env off, requests skips the
+# per-call os.environ/no_proxy scan and ~/.netrc lookup (whose Basic auth would
+# also override the Bearer header).
+session.trust_env = False
+session.proxies.update(requests.utils.get_environ_proxies(BASE))
+session.verify = os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE") or True
 
-def _headers() -> Dict[str, str]:
-    return {
-        "Authorization": f"Bearer {next(_key_cycle)}",
-        "Accept": "application/json",
-        "User-Agent": "alphaops-coinalyze/1.2",
-    }
+# ---- Rate limiting ----
+class TokenBucket:
+    """Thread-safe token bucket; acquire() blocks until one request may be sent."""
+    def __init__(self, capacity: float, refill_per_sec: float):
+        self.capacity = capacity
+        self.refill_per_sec = refill_per_sec
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.refill_per_sec)
+                self.stamp = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.refill_per_sec
+            time.sleep(wait)
+
+    def cap(self, remaining: float):
+        """Never hold more tokens than the server says are left."""
+        with self.lock:
+            self.tokens = min(self.tokens, remaining)
+
+# Coinalyze allows ~40 calls/min per key; pacing up front avoids paying a rejected
+# round trip plus a 30-60s 429 sleep. Keys are rotated, so the budget scales with them.
+_bucket = TokenBucket(RATE_PER_MIN * len(_API_KEYS), RATE_PER_MIN * len(_API_KEYS) / 60.0) if RATE_PER_MIN > 0 else None
+
+# ---- Status dispatch ----
+_OK, _RATE_LIMITED, _SERVER_ERROR = "ok", "rate_limited", "server_error"
+_STATUS_ACTION = {
+    **{code: _OK for code in range(200, 300)},
+    429: _RATE_LIMITED,
+    **{code: _SERVER_ERROR for code in range(500, 600)},
+}
 
-def _get(path: str, params: Optional[Dict[str, Any]] = None, timeout: Optional[float] = None) -> Any:
+@functools.lru_cache(maxsize=None)
+def _url(path: str) -> str:
+    # endpoint paths are a small fixed set -> build each full URL once, so the
+    # leading-slash fix-up costs nothing after the first call
+    return BASE + "/" + path.lstrip("/")
+
+def _request(path: str, params: Union[Dict[str, Any], str, None] = None, timeout: Optional[float] = None,
+             stream: bool = False) -> requests.Response:
     """GET with resilient 429 handling. Falls back to 60s sleep if Retry-After header is malformed."""
-    url = f"{BASE}{path if path.startswith('/') else '/' + path}"
+    url = _url(path)
     tries, max_tries = 0, 8
     backoff = 5  # for 5xx
     while True:
         tries += 1
-        r = session.get(url, headers=_headers(), params=params or {}, timeout=timeout or DEFAULT_TIMEOUT)
+        if _bucket:
+            _bucket.acquire()
+        r = session.get(url, headers=next(_header_cycle), params=params or {},
+                        timeout=timeout or DEFAULT_TIMEOUT, stream=stream)
+        if _bucket:
+            remaining = r.headers.get("X-RateLimit-Remaining")
+            if remaining is not None and remaining.strip().isdigit():
+                _bucket.cap(float(remaining))
+
+        action = _STATUS_ACTION.get(r.status_code)
 
         # Success
-        if 200 <= r.status_code < 300:
-            return r.json()
+        if action is _OK:
+            return r
+        r.close()  # hand a streamed connection back to the pool before retrying
 
         # Coinalyze rate limiting
-        if r.status_code == 429:
+        if action is _RATE_LIMITED:
             ra = r.headers.get("Retry-After","").strip()
             try:
                 wait = int(float(ra)) if ra else 60
             except Exception:
                 wait = 60
             wait = max(wait, 30)  # floor
-            print(f"[429] {path} -> sleep {wait}s (try {tries}/{max_tries})")
+            if _bucket:
+                _bucket.cap(0)  # everyone else backs off too, not just this caller
+            wait += random.uniform(0, 0.25 * wait)  # desync concurrent retriers
+            print(f"[429] {path} -> sleep {wait:.1f}s (try {tries}/{max_tries})")
             time.sleep(wait)
             continue
 
         # Transient server error
-        if 500 <= r.status_code < 600 and tries < max_tries:
-            print(f"[{r.status_code}] {path} -> backoff {backoff}s (try {tries}/{max_tries})")
-            time.sleep(backoff)
+        if action is _SERVER_ERROR and tries < max_tries:
+            delay = backoff + random.uniform(0, 0.2 * backoff)
+            print(f"[{r.status_code}] {path} -> backoff {delay:.1f}s (try {tries}/{max_tries})")
+            time.sleep(delay)
             backoff = min(int(backoff * 1.8), 120)
             continue
 
         # Hard errors or exhausted
         r.raise_for_status()
 
+def _get(path: str, params: Union[Dict[str, Any], str, None] = None, timeout: Optional[float] = None) -> Any:
+    return _json_loads(_request(path, params, timeout).content)
+
+# ---- Fan-out ----
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:  # concurrent first callers must not each start a pool
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="coinalyze")
+    return _executor
+
+def fetch_many(fn: Callable[..., Any], symbols_list: Iterable[str], *args, **kwargs) -> Dict[str, Any]:
+    """
+    Call a per-symbol wrapper (e.g. get_ohlcv_history) for many symbols at once.
+    Requests share the pooled session and keep _get's 429/5xx handling.
+    Returns {symbol: response}; wall time ~ slowest call up to MAX_WORKERS in flight.
+    """
+    symbols_list = list(symbols_list)
+    results = _pool().map(lambda s: fn(s, *args, **kwargs), symbols_list)
+    return dict(zip(symbols_list, results))
+
+# ---- Symbol batching ----
+# The API takes a comma-separated `symbols` list (max 20 per call), so iterables
+# are sent as a few joined requests instead of one round trip per symbol.
+SYMBOLS_PER_CALL = 20
+Symbols = Union[str, Iterable[str]]
+
+def _symbol_batches(symbols: Symbols) -> List[str]:
+    if isinstance(symbols, str):
+        return [symbols]
+    it, out = iter(symbols), []
+    while True:
+        chunk = list(itertools.islice(it, SYMBOLS_PER_CALL))
+        if not chunk:
+            return out
+        out.append(",".join(chunk))
+
+def _merge_batches(symbols: Symbols, fetch: Callable[[str], Any]) -> Any:
+    """Run fetch(batch) per symbol batch; list responses of all batches are concatenated."""
+    batches = _symbol_batches(symbols)
+    if len(batches) == 1:
+        return fetch(batches[0])
+    merged: List[Any] = []
+    for resp in _pool().map(fetch, batches):
+        merged.extend(resp if isinstance(resp, list) else [resp])
+    return merged
+
+def _get_symbols(path: str, symbols: Symbols, params: Dict[str, Any]) -> Any:
+    """_get for endpoints taking `symbols`."""
+    return _merge_batches(symbols, lambda b: _get(path, {"symbols": b, **params}))
+
+@functools.lru_cache(maxsize=256)
+def _history_query(symbols: str, interval: str, convert_to_usd: Optional[bool]) -> str:
+    # scrolling-window callers repeat symbols/interval and only move from/to
+    q = {"symbols": symbols, "interval": interval}
+    if convert_to_usd is not None:
+        q["convert_to_usd"] = "true" if convert_to_usd else "false"
+    return urlencode(q)
+
+def _get_history(path: str, symbols: Symbols, interval: str, start_ts: int, end_ts: int,
+                 convert_to_usd: Optional[bool] = None) -> Any:
+    """_get for history endpoints; the static part of the query string is encoded once."""
+    window = f"&from={start_ts}&to={end_ts}"
+    return _merge_batches(symbols, lambda b: _get(path, _history_query(b, interval, convert_to_usd) + window))
+
 # ---- Discovery ----
-def get_exchanges():      return _get("/exchanges")
-def get_future_markets(): return _get("/future-markets")
-def get_spot_markets():   return _get("/spot-markets")
+def _cached_discovery(name: str, path: str) -> Any:
+    """Catalog endpoints change rarely: serve them from disk for DISCOVERY_TTL seconds."""
+    if DISCOVERY_TTL <= 0:
+        return _get(path)
+    fpath = os.path.join(CACHE_DIR, f"{_API_HOST}-{name}.json")  # one cache per API host
+    try:
+        if time.time() - os.path.getmtime(fpath) < DISCOVERY_TTL:
+            with open(fpath, "rb") as f:
+                return _json_loads(f.read())
+    except (OSError, ValueError):
+        pass  # missing/stale/corrupt -> refetch
+    data = _get(path)
+    try:
+        os.makedirs(CACHE_DIR, mode=0o700, exist_ok=True)
+        tmp = f"{fpath}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"), ensure_ascii=False)
+        os.replace(tmp, fpath)
+    except OSError as e:
+        print(f"[cache] cannot write {fpath}: {e!r}")
+    return data
+
+def get_exchanges():      return _cached_discovery("exchanges", "/exchanges")
+def get_future_markets(): return _cached_discovery("future_markets", "/future-markets")
+def get_spot_markets():   return _cached_discovery("spot_markets", "/spot-markets")
 
 # ---- Snapshots (require symbols) ----
-def get_open_interest(symbols: str, convert_to_usd: bool=False):
-    return _get("/open-interest", {"symbols": symbols, "convert_to_usd": str(convert_to_usd).lower()})
+def get_open_interest(symbols: Symbols, convert_to_usd: bool=False):
+    return _get_symbols("/open-interest", symbols, {"convert_to_usd": "true" if convert_to_usd else "false"})
 
-def get_funding_rate(symbols: str):
-    return _get("/funding-rate", {"symbols": symbols})
+def get_funding_rate(symbols: Symbols):
+    return _get_symbols("/funding-rate", symbols, {})
 
-def get_predicted_funding_rate(symbols: str):
-    return _get("/predicted-funding-rate", {"symbols": symbols})
+def get_predicted_funding_rate(symbols: Symbols):
+    return _get_symbols("/predicted-funding-rate", symbols, {})
 
 # ---- Histories (symbols, interval, from, to) ----
-def get_open_interest_history(symbols: str, interval: str, start_ts: int, end_ts: int, convert_to_usd: bool=False):
-    return _get("/open-interest-history", {
-        "symbols": symbols, "interval": interval, "from": start_ts, "to": end_ts,
-        "convert_to_usd": str(convert_to_usd).lower()
-    })
-
-def get_funding_rate_history(symbols: str, interval: str, start_ts: int, end_ts: int):
-    return _get("/funding-rate-history", {
-        "symbols": symbols, "interval": interval, "from": start_ts, "to": end_ts
-    })
-
-def get_predicted_funding_rate_history(symbols: str, interval: str, start_ts: int, end_ts: int):
-    return _get("/predicted-funding-rate-history", {
-        "symbols": symbols, "interval": interval, "from": start_ts, "to": end_ts
-    })
-
-def get_long_short_ratio_history(symbols: str, interval: str, start_ts: int, end_ts: int):
-    return _get("/long-short-ratio-history", {
-        "symbols": symbols, "interval": interval, "from": start_ts, "to": end_ts
-    })
-
-def get_liquidation_history(symbols: str, interval: str, start_ts: int, end_ts: int, convert_to_usd: bool=False):
-    return _get("/liquidation-history", {
-        "symbols": symbols, "interval": interval, "from": start_ts, "to": end_ts,
-        "convert_to_usd": str(convert_to_usd).lower()
-    })
-
-def get_ohlcv_history(symbols: str, interval: str, start_ts: int, end_ts: int):
+def get_open_interest_history(symbols: Symbols, interval: str, start_ts: int, end_ts: int, convert_to_usd: bool=False):
+    return _get_history("/open-interest-history", symbols, interval, start_ts, end_ts, convert_to_usd)
+
+def get_funding_rate_history(symbols: Symbols, interval: str, start_ts: int, end_ts: int):
+    return _get_history("/funding-rate-history", symbols, interval, start_ts, end_ts)
+
+def get_predicted_funding_rate_history(symbols: Symbols, interval: str, start_ts: int, end_ts: int):
+    return _get_history("/predicted-funding-rate-history", symbols, interval, start_ts, end_ts)
+
+def get_long_short_ratio_history(symbols: Symbols, interval: str, start_ts: int, end_ts: int):
+    return _get_history("/long-short-ratio-history", symbols, interval, start_ts, end_ts)
+
+def get_liquidation_history(symbols: Symbols, interval: str, start_ts: int, end_ts: int, convert_to_usd: bool=False):
+    return _get_history("/liquidation-history", symbols, interval, start_ts, end_ts, convert_to_usd)
+
+def get_ohlcv_history(symbols: Symbols, interval: str, start_ts: int, end_ts: int):
     # Prefer new path when present (includes bv), fallback to legacy
     try:
-        return _get("/get-ohlcv-history", {"symbols": symbols, "interval": interval, "from": start_ts, "to": end_ts})
+        return _get_history("/get-ohlcv-history", symbols, interval, start_ts, end_ts)
     except requests.HTTPError as e:
         if e.response is not None and e.response.status_code == 404:
-            return _get("/ohlcv-history", {"symbols": symbols, "interval": interval, "from": start_ts, "to": end_ts})
+            return _get_history("/ohlcv-history", symbols, interval, start_ts, end_ts)
         raise
+
+def iter_ohlcv_history(symbol: str, interval: str, start_ts: int, end_ts: int) -> Iterator[Dict[str, Any]]:
+    """
+    Yield one symbol's OHLCV bars while the body is still arriving (ijson),
+    instead of materializing multi-MB year-long responses. Without ijson the
+    body is decoded once and bars are yielded from it. Bars carry no symbol
+    tag, so several symbols would be indistinguishable: use get_ohlcv_history.
+    """
+    if not isinstance(symbol, str) or "," in symbol:
+        raise ValueError("iter_ohlcv_history streams a single symbol; use get_ohlcv_history for several")
+    params = {"symbols": symbol, "interval": interval, "from": start_ts, "to": end_ts}
+    try:
+        r = _request("/get-ohlcv-history", params, stream=True)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 404:
+            raise
+        r = _request("/ohlcv-history", params, stream=True)
+    with r:
+        if ijson is None:
+            for item in _json_loads(r.content) or []:
+                if isinstance(item, dict):
+                    yield from item.get("history") or []
+            return
+        r.raw.decode_content = True
+        yield from ijson.items(r.raw, "item.history.item", use_float=True)
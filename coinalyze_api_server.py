@@ -1,92 +1,526 @@
 # coinalyze_api_server.py
-# Simplified parser for flat-line CoinAnalyzer logs
+# Simplified parser for CoinAnalyzer snapshots (flat-line logs or data_sink JSON packs)
 
-import os, time, re, glob, logging
-from pathlib import Path
+import os, time, re, json, zlib, mmap, glob, heapq, asyncio, logging, threading, functools, itertools, contextlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+    _json_loads, _json_dumps = orjson.loads, orjson.dumps
+except ImportError:  # stdlib fallback keeps the server importable without orjson
+    _json_loads = lambda b: json.loads(bytes(b))
+    _json_dumps = lambda o: json.dumps(o, separators=(",", ":")).encode()
+
+class _JSON(Response):
+    # ORJSONResponse is deprecated in current FastAPI; this is the same thing
+    # on top of whichever _json_dumps is available
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return _json_dumps(content)
+
+try:
+    import ijson
+except ImportError:  # optional: large packs are then decoded whole with orjson
+    ijson = None
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:  # optional: without it every listing walks DATA_DIR
+    Observer = None
+    FileSystemEventHandler = object
 
 # ---------- ENV ----------
 DATA_DIR = os.getenv("DATA_DIR", "/data")
 FILE_GLOB = os.getenv("FILE_GLOB", "**/*.json")
 SCAN_LIMIT = int(os.getenv("SCAN_LIMIT", "1000"))
 CACHE_TTL_SEC = int(os.getenv("CACHE_TTL_SEC", "5"))
+INDEX_CACHE_TTL_SEC = int(os.getenv("INDEX_CACHE_TTL_SEC", "60"))  # backstop while the watcher is live
+CACHE_MAX = int(os.getenv("CACHE_MAX", "1024"))  # entries; least recently used is evicted past this
+DIRLIST_MAX = int(os.getenv("DIRLIST_MAX", "4096"))  # directory listings kept for the scandir walk
+MMAP_MIN_BYTES = int(os.getenv("MMAP_MIN_BYTES", "16384"))  # below this a plain read() is cheaper
+STREAM_MIN_BYTES = int(os.getenv("STREAM_MIN_BYTES", "262144"))  # stream packs this big with ijson
+STAT_THREADS = int(os.getenv("STAT_THREADS", "16"))  # parallel file reads on a miss; <=1 reads serially
+REFRESH_IDLE_SEC = int(os.getenv("REFRESH_IDLE_SEC", "60"))  # keep refreshing a symbol this long after its last request; 0 disables
+REFRESH_MAX = int(os.getenv("REFRESH_MAX", "32"))  # symbols kept warm at once; least recently requested drops out
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [coinalyze_api] %(message)s")
 log = logging.getLogger("coinalyze_api")
 
 # ---------- FASTAPI ----------
-app = FastAPI(title="CoinAnalyzer FlatLog API", version="1.0")
-app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["GET"], allow_headers=["*"])
+# routes still build their responses explicitly: a returned dict would first go
+# through jsonable_encoder, which costs more than the encoding it feeds
+app = FastAPI(title="CoinAnalyzer FlatLog API", version="1.0", default_response_class=_JSON)
+
+# Read-only GET API open to any origin: the CORS headers never vary, so they
+# are built once and appended as raw bytes instead of running CORSMiddleware.
+_CORS_HEADERS = [(b"access-control-allow-origin", b"*")]
+_PREFLIGHT_HEADERS = _CORS_HEADERS + [
+    (b"access-control-allow-methods", b"GET"),
+    (b"access-control-max-age", b"600"),
+    (b"content-length", b"0"),
+]
+
+class _StaticCORS:
+    def __init__(self, app):
+        self.app = app
 
-_cache: Dict[str, Any] = {}
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if scope["method"] == "OPTIONS":
+            req = dict(scope["headers"])
+            if b"access-control-request-method" in req:
+                headers = list(_PREFLIGHT_HEADERS)
+                if b"access-control-request-headers" in req:  # allow_headers=["*"]
+                    headers.append((b"access-control-allow-headers", req[b"access-control-request-headers"]))
+                await send({"type": "http.response.start", "status": 200, "headers": headers})
+                return await send({"type": "http.response.body", "body": b""})
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", ())) + _CORS_HEADERS
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
+
+app.add_middleware(_StaticCORS)
+
+# key -> (fill time, fs version, payload), least recently used first; stale entries go lazily on lookup
+_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+# one recompute per key at a time; concurrent misses wait and reuse its result.
+# key -> [lock, holders + waiters]; dropped once nobody holds or awaits it
+_cache_locks: Dict[tuple, list] = {}
+# symbols polled recently -> last request time; the refresher keeps their entries warm
+_hot: "OrderedDict[str, float]" = OrderedDict()
+_refresher: Optional[asyncio.Task] = None
 
 # ---------- HELPERS ----------
-def _cache_get(k: str):
-    if k in _cache:
-        exp, payload = _cache[k]
-        if time.time() < exp:
-            return payload
-        else:
-            _cache.pop(k, None)
+def _cache_get(k: tuple):
+    # While the watcher is live an entry holds until a file under DATA_DIR
+    # changes, or at most INDEX_CACHE_TTL_SEC: writes from another host on a
+    # shared volume, or an overflowed inotify queue, raise no event. Without
+    # the watcher, CACHE_TTL_SEC is the only bound on staleness.
+    hit = _cache.get(k)
+    if hit is None:
+        return None
+    ttl = INDEX_CACHE_TTL_SEC if _index_live else CACHE_TTL_SEC
+    if hit[1] == _fs_version and time.time() - hit[0] < ttl:
+        _cache.move_to_end(k)
+        return hit[2]
+    del _cache[k]
     return None
 
-def _cache_set(k: str, payload: Any):
-    _cache[k] = (time.time() + CACHE_TTL_SEC, payload)
+def _cache_set(k: tuple, payload: Any, version: int):
+    # version is _fs_version as read before computing payload, so a write that
+    # lands mid-computation invalidates it
+    _cache[k] = (time.time(), version, payload)
+    _cache.move_to_end(k)
+    if len(_cache) > CACHE_MAX:
+        _cache.popitem(last=False)
+
+@contextlib.asynccontextmanager
+async def _cache_lock(k: tuple):
+    # runs on the event loop only, so the count needs no lock of its own
+    entry = _cache_locks.get(k)
+    if entry is None:
+        entry = _cache_locks[k] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _cache_locks[k]
+
+def _glob_suffix(pattern: str) -> Optional[str]:
+    # "**/*.json" -> ".json"; anything fancier goes through glob
+    if pattern.startswith("**/*"):
+        rest = pattern[4:]
+        if rest and not any(c in rest for c in "*?[/"):
+            return rest
+    return None
+
+# (dir, suffix) -> (dir st_mtime_ns, [file names], [(name, subdir)]). Adding or
+# removing an entry bumps the directory's mtime, so an unchanged directory skips
+# the readdir. A rewrite in place does not, so file mtimes are always stat'ed
+# fresh. Least recently used first; capped at DIRLIST_MAX directories.
+_dirlist_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+_dirlist_lock = threading.Lock()
+
+def _dirlist_evict(gone: List[str]):
+    # drop cached listings of vanished subdirectories and everything below them
+    prefixes = tuple(p + os.sep for p in gone)
+    with _dirlist_lock:
+        for key in [k for k in _dirlist_cache if k[0] in gone or k[0].startswith(prefixes)]:
+            del _dirlist_cache[key]
+
+def _dir_listing(d: str, suffix: str):
+    """(identity, [(mtime, file)], [(name, subdir)]) for d; identity is the
+    (st_dev, st_ino) of what d resolves to, None when it can't be read."""
+    try:
+        st = os.stat(d)
+    except OSError:
+        _dirlist_evict([d])
+        return None, (), ()
+    ident, mtime_ns = (st.st_dev, st.st_ino), st.st_mtime_ns
+    with _dirlist_lock:
+        hit = _dirlist_cache.get((d, suffix))
+        fresh = hit is not None and hit[0] == mtime_ns
+        if fresh:
+            _dirlist_cache.move_to_end((d, suffix))
+    if fresh:
+        files = []
+        for name in hit[1]:
+            path = os.path.join(d, name)
+            try:
+                files.append((os.stat(path).st_mtime, path))
+            except OSError:
+                continue  # vanished or dangling symlink
+        return ident, files, hit[2]
+    names, files, dirs = [], [], []
+    try:
+        with os.scandir(d) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue  # glob's ** / * skip hidden entries too
+                if entry.is_dir():  # follows symlinked folders, as glob's ** does
+                    dirs.append((entry.name, entry.path))
+                elif entry.name.endswith(suffix):
+                    names.append(entry.name)
+                    try:
+                        files.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        continue  # vanished or dangling symlink
+    except OSError:
+        return None, (), ()
+    if hit is not None:
+        kept = {p for _, p in dirs}
+        gone = [p for _, p in hit[2] if p not in kept]
+        if gone:
+            _dirlist_evict(gone)
+    with _dirlist_lock:
+        _dirlist_cache[(d, suffix)] = (mtime_ns, names, dirs)
+        _dirlist_cache.move_to_end((d, suffix))
+        while len(_dirlist_cache) > DIRLIST_MAX:
+            _dirlist_cache.popitem(last=False)
+    return ident, files, dirs
+
+def _scandir_recursive(root: str, suffix: str, prune=None):
+    """Yield (mtime, path) for files under root ending in suffix.
+    Directories for which prune(name, path) is true are not descended into."""
+    # explicit stack: a nested yield-from chain would pass every entry up
+    # through one generator frame per directory level
+    stack = [root]
+    seen = set()  # (st_dev, st_ino) of visited directories: symlink loops end here
+    while stack:
+        ident, files, dirs = _dir_listing(stack.pop(), suffix)
+        if ident is None or ident in seen:
+            continue
+        seen.add(ident)
+        yield from files
+        stack.extend(path for name, path in reversed(dirs) if prune is None or not prune(name, path))
+
+# ---------- LATEST-FILE INDEX ----------
+# With watchdog installed, inotify events keep the newest INDEX_SIZE files of
+# DATA_DIR in memory, so listings are served without touching the filesystem.
+# Invariant: every file not in the index is older than every file in it, and
+# while nothing has been evicted (_index_complete) the index holds every file.
+INDEX_SIZE = max(SCAN_LIMIT, 1000)
+_INDEX_SUFFIX = _glob_suffix(FILE_GLOB)
+_index: Dict[str, float] = {}
+_index_lock = threading.Lock()
+_index_live = False
+_index_complete = False
+_observer = None
+_fs_version = 0  # bumped on every indexed create/modify/delete; tags _cache entries
+
+def _index_put(path: str):
+    global _index_complete, _fs_version
+    if not path.endswith(_INDEX_SUFFIX) or f"{os.sep}." in path[len(DATA_DIR):]:
+        return
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return _index_drop(path)
+    with _index_lock:
+        _fs_version += 1
+        _index[path] = mtime
+        if len(_index) > 2 * INDEX_SIZE:  # amortized trim back to the newest INDEX_SIZE
+            keep = heapq.nlargest(INDEX_SIZE, _index.items(), key=lambda kv: kv[1])
+            _index.clear()
+            _index.update(keep)
+            _index_complete = False
+
+def _index_drop(path: str, is_dir: bool = False):
+    global _fs_version
+    with _index_lock:
+        _fs_version += 1
+        if is_dir:
+            prefix = path.rstrip(os.sep) + os.sep
+            for p in [p for p in _index if p.startswith(prefix)]:
+                del _index[p]
+        else:
+            _index.pop(path, None)
+
+class _IndexHandler(FileSystemEventHandler):
+    def on_created(self, event):
+        if not event.is_directory:
+            _index_put(event.src_path)
 
-def _rscan_latest(base: str, pattern: str, limit: int) -> List[Path]:
-    basep = Path(base)
-    if not basep.exists():
+    on_modified = on_created
+
+    def on_deleted(self, event):
+        _index_drop(event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        _index_drop(event.src_path, event.is_directory)
+        if not event.is_directory:
+            _index_put(event.dest_path)
+        else:
+            for _, p in _scandir_recursive(event.dest_path, _INDEX_SUFFIX):
+                _index_put(p)
+
+def _stat_paths(paths):
+    for p in paths:
+        try:
+            yield os.stat(p).st_mtime, p
+        except OSError:
+            continue
+
+def _newest(entries, limit: int):
+    # (mtime, path) pairs, newest first; a single max() pass for the top-1 case
+    if limit <= 1:
+        top = max(entries, default=None)
+        return [top] if top else []
+    return heapq.nlargest(limit, entries)
+
+def _rscan_latest(base: str, pattern: str, limit: int, prune=None) -> List[str]:
+    if _index_live and base == DATA_DIR and pattern == FILE_GLOB and (_index_complete or limit <= len(_index)):
+        with _index_lock:
+            top = _newest(((m, p) for p, m in _index.items()), limit)
+        return [p for _, p in top]
+    if not os.path.exists(base):
         log.warning("DATA_DIR missing: %s", base)
         return []
-    files = glob.glob(str(basep / pattern), recursive=True)
-    files.sort(key=lambda p: Path(p).stat().st_mtime, reverse=True)
-    return [Path(f) for f in files[:max(1, limit)]]
-
-def _infer_symbol(path: Path) -> str:
-    for seg in path.parts:
-        if "BTC" in seg.upper():
-            return seg.split("_")[0].upper()
-    return "UNKNOWN"
-
-# Regex to match flat-line logs
-LINE_RE = re.compile(
-    r"TF[:=]?(?P<tf>\S+).*?"
-    r"OI[:=]?(?P<oi>[-\d\.]+).*?"
-    r"FR[:=]?(?P<fr>[-\d\.]+).*?"
-    r"LIQ[:=]?(?P<liq>[-\d\.]+).*?"
-    r"LS[:=]?(?P<ls>[-\d\.]+).*?"
-    r"CVD[:=]?(?P<cvd>[-\d\.]+)",
+    suffix = _glob_suffix(pattern)
+    if suffix is None:
+        entries = _stat_paths(glob.iglob(os.path.join(base, pattern), recursive=True))
+    else:
+        entries = _scandir_recursive(base, suffix, prune)
+    # keep only the newest `limit` while walking instead of sorting every match
+    top = _newest(entries, limit)
+    return [p for _, p in top]
+
+# Folder / TF-token spellings -> the short form the API speaks
+_INTERVAL_MAP = {
+    "1m": "1m", "1min": "1m", "1mins": "1m", "60s": "1m",
+    "5m": "5m", "5min": "5m", "5mins": "5m",
+    "15m": "15m", "15min": "15m", "15mins": "15m",
+    "30m": "30m", "30min": "30m", "30mins": "30m",
+    "1h": "1h", "1hour": "1h", "60m": "1h", "60min": "1h", "60mins": "1h",
+    "4h": "4h", "4hour": "4h", "240min": "4h",
+    "1d": "1d", "daily": "1d", "1day": "1d",
+}
+
+def _norm_interval(raw: str) -> str:
+    v = _INTERVAL_MAP.get(raw)
+    if v:
+        return v
+    s = raw.strip().lower()
+    return _INTERVAL_MAP.get(s, s)
+
+# Symbol and interval live in the directory part of the layout, and every file
+# of a day shares it, so both lookups are memoized on the parent directory.
+@functools.lru_cache(maxsize=1024)
+def _interval_for_dir(d: str) -> Optional[str]:
+    for seg in reversed(d.split(os.sep)):
+        v = _INTERVAL_MAP.get(seg) or _INTERVAL_MAP.get(seg.lower())
+        if v:
+            return v
+    return None
+
+def _symbol_for_seg(seg: str) -> Optional[str]:
+    u = seg.upper()
+    if "PERP" in u or "BTC" in u or u.endswith(("USDT", "USD")):
+        return u.split("_")[0]
+    return None
+
+@functools.lru_cache(maxsize=1024)
+def _symbol_for_dir(d: str) -> Optional[str]:
+    # the symbol folder sits just above interval/day, so walk up from the file
+    for seg in reversed(d.split(os.sep)):
+        sym = _symbol_for_seg(seg)
+        if sym:
+            return sym
+    return None
+
+_STEM_SPLIT = re.compile(r"[_.-]")
+
+def _interval_for_name(name: str) -> Optional[str]:
+    # flat logs may carry the timeframe in the file name only: BTC_15m.json
+    for tok in reversed(_STEM_SPLIT.split(os.path.splitext(name)[0])):
+        v = _INTERVAL_MAP.get(tok) or _INTERVAL_MAP.get(tok.lower())
+        if v:
+            return v
+    return None
+
+def _path_interval(path: str) -> Optional[str]:
+    d, name = os.path.split(path)
+    return _interval_for_dir(d) or _interval_for_name(name)
+
+def _infer_symbol(path: str) -> str:
+    # flat logs may only name the symbol in the file: flat/BTC_15m.json
+    d, name = os.path.split(path)
+    return _symbol_for_dir(d) or _symbol_for_seg(os.path.splitext(name)[0]) or "UNKNOWN"
+
+# One pass over the raw bytes picks up every KEY[:=]VALUE token; the first
+# occurrence of each key wins. TF takes any token, the rest numbers only.
+_FLAT_RE = re.compile(
+    rb"(?<![A-Za-z])(?:(TF)[:=]?(\S+)|(OI|FR|LIQ|LS|CVD)[:=]?([-+\d.eE]+))",
     re.IGNORECASE
 )
+_CVD_DIV = ("bearish", "none", "bullish")
+_FLAT_KEYS = frozenset((b"OI", b"FR", b"LIQ", b"LS", b"CVD"))
 
-def _parse_flat_file(path: Path) -> Optional[Dict[str, Any]]:
+def _flat_values(buf: bytes) -> Optional[tuple]:
+    tf = None
+    vals: Dict[bytes, float] = {}
+    # finditer, not findall: once TF and every key are seen (normally by the end
+    # of the first summary line) the rest of the file is never scanned or paged in
+    for m in _FLAT_RE.finditer(buf):
+        tk, tv, k, v = m.groups()
+        if tk:
+            if tf is None:
+                tf = tv.decode("ascii", "ignore")
+        else:
+            k = k.upper()
+            if k not in vals:
+                try:
+                    vals[k] = float(v)
+                except ValueError:
+                    continue  # lone "-", "." or a stray "e"
+        if tf is not None and len(vals) == len(_FLAT_KEYS):
+            break
+    if tf is None or len(vals) < len(_FLAT_KEYS):
+        return None
+    return (tf,) + tuple(vals[k] for k in (b"OI", b"FR", b"LIQ", b"LS", b"CVD"))
+
+def _num(v: Any) -> float:
+    # orjson already hands back floats for most fields: skip the float() call for those
+    return v if type(v) is float else float(v)
+
+def _pack_values(obj: Any) -> Optional[tuple]:
+    # data_sink pack -> the same fields coinalyze_loop prints as its flat summary line
+    if isinstance(obj, list):
+        obj = obj[-1] if obj else None
+    if not isinstance(obj, dict):
+        return None
+    snaps = obj.get("snapshots") or {}
+    hist = obj.get("history") or {}
+    cvd = hist.get("cvd") or ()
     try:
-        text = path.read_text(encoding="utf-8", errors="ignore").strip()
-    except Exception as e:
-        log.warning("Cannot read %s: %s", path, e)
+        # row layout [{"ts", "cvd", ...}, ...] or column layout {"ts": [...], "cvd": [...]}
+        cvd_last = cvd["cvd"][-1] if isinstance(cvd, dict) else cvd[-1]["cvd"]
+        return (
+            str(obj.get("interval") or ""),
+            _num(snaps["oi_value"]),
+            _num(snaps["fr_value"]),
+            float(len(hist.get("liquidations") or ())),
+            float(len(hist.get("long_short_ratio") or ())),
+            _num(cvd_last),
+        )
+    except (KeyError, IndexError, TypeError, ValueError):
         return None
 
-    if not text:
+# value events that open one array element (map_key/end_* share the prefix)
+_ITEM_EVENTS = frozenset(("start_map", "start_array", "string", "number", "boolean", "null"))
+
+def _stream_pack_values(fh) -> Optional[tuple]:
+    """_pack_values over an ijson event stream: counts and last values are kept
+    as they go by, so memory stays flat however long the history arrays are."""
+    interval, oi, fr, cvd = "", None, None, None
+    n_liq = n_ls = 0
+    for prefix, event, value in ijson.parse(fh, use_float=True):
+        if prefix == "history.cvd.item.cvd" or prefix == "history.cvd.cvd.item":
+            cvd = value
+        elif prefix == "history.cvd.item":
+            if event in _ITEM_EVENTS:
+                cvd = None  # a new row: only the last row's "cvd" counts, as in _pack_values
+        elif prefix == "history.liquidations.item":
+            n_liq += event in _ITEM_EVENTS
+        elif prefix == "history.long_short_ratio.item":
+            n_ls += event in _ITEM_EVENTS
+        elif prefix == "snapshots.oi_value":
+            oi = value
+        elif prefix == "snapshots.fr_value":
+            fr = value
+        elif prefix == "interval":
+            interval = value
+        elif prefix == "" and event == "start_array":
+            return None  # a list of packs: let orjson take the last one
+    try:
+        return (str(interval or ""), _num(oi), _num(fr), float(n_liq), float(n_ls), _num(cvd))
+    except (TypeError, ValueError):
         return None
 
-    m = LINE_RE.search(text)
-    if not m:
+_JSON_HEAD = re.compile(rb"\s*[\[{]")
+
+# a pack without both snapshot keys can't yield values; find() rules it out
+# at memchr speed before any JSON decoding
+_PACK_KEYS = (b'"oi_value"', b'"fr_value"')
+
+def _buf_values(buf, stream: bool = False) -> Optional[tuple]:
+    # buf is bytes or an mmap; both go through orjson and re without copying
+    if _JSON_HEAD.match(buf) and all(buf.find(k) != -1 for k in _PACK_KEYS):
+        if stream:
+            try:
+                buf.seek(0)
+                vals = _stream_pack_values(buf)
+                if vals is not None:
+                    return vals
+            except ijson.JSONError:
+                pass
+        try:
+            with memoryview(buf) as mv:
+                vals = _pack_values(_json_loads(mv))
+            if vals is not None:
+                return vals
+        except ValueError:
+            pass  # flat text that happens to open with a bracket
+    return _flat_values(buf)
+
+@functools.lru_cache(maxsize=4096)
+def _parse_cached(path: str, mtime_ns: int, size: int) -> Optional[Dict[str, Any]]:
+    # mtime_ns/size are part of the key only: a rewritten file gets a fresh entry,
+    # even within one tick of a coarse-mtime filesystem
+    try:
+        with open(path, "rb") as f:
+            if size >= MMAP_MIN_BYTES:
+                # big packs: parse straight out of the page cache, no read() copy
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    vals = _buf_values(mm, stream=ijson is not None and size >= STREAM_MIN_BYTES)
+            else:
+                vals = _buf_values(f.read())
+    except Exception as e:
+        # per-file and routine (rotation, retention_cleanup): keep it off the hot path
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Cannot read %s: %r", path, e)
+        return None
+    if vals is None:
         return None
 
-    g = m.groupdict()
-    tf = g.get("tf", "")
-    oi = float(g.get("oi", 0))
-    fr = float(g.get("fr", 0))
-    liq = float(g.get("liq", 0))
-    ls = float(g.get("ls", 0))
-    cvd = float(g.get("cvd", 0))
+    tf, oi, fr, liq, ls, cvd = vals
 
-    # Basic derived fields
-    cvd_div = "bullish" if ls > liq * 1.05 else ("bearish" if liq > ls * 1.05 else "none")
+    # Basic derived fields: bool arithmetic picks bearish / none / bullish
+    cvd_div = _CVD_DIV[(ls > liq * 1.05) - (liq > ls * 1.05) + 1]
 
     return {
         "symbol": _infer_symbol(path),
@@ -97,66 +531,308 @@ def _parse_flat_file(path: Path) -> Optional[Dict[str, Any]]:
         "liq_short": ls,
         "cvd": cvd,
         "cvd_divergence": cvd_div,
-        "_file": str(path),
-        "ts": int(path.stat().st_mtime),
+        "_file": path,
+        "ts": mtime_ns // 1_000_000_000,
     }
 
+def _parse_flat_file(path: str, st: Optional[os.stat_result] = None) -> Optional[Dict[str, Any]]:
+    # pass the stat from a scandir pass to skip the extra syscall
+    if st is None:
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Cannot stat %s: %r", path, e)
+            return None
+    return _parse_cached(path, st.st_mtime_ns, st.st_size)
+
+def _subdirs(path: str):
+    # follows symlinked folders, like the scandir walker
+    try:
+        with os.scandir(path) as it:
+            return [e for e in it if not e.name.startswith(".") and e.is_dir()]
+    except OSError:
+        return []
+
+def _first_visit(entry, seen: set) -> bool:
+    # the walker's cycle rule: a directory reached twice (through symlinks) counts once
+    try:
+        st = entry.stat()
+    except OSError:
+        return False
+    ident = (st.st_dev, st.st_ino)
+    if ident in seen:
+        return False
+    seen.add(ident)
+    return True
+
+def _layout_days(symbol: str, tfs) -> Dict[str, Dict[str, List[str]]]:
+    """One walk of the collector layout <SYM>/<interval>/<YYYYMMDD>/ for all wanted
+    timeframes at once: {tf: {day: [day dirs]}}."""
+    out: Dict[str, Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+    if _glob_suffix(FILE_GLOB) is None:
+        return out
+    seen: set = set()
+    for sym in _subdirs(DATA_DIR):
+        if symbol not in sym.name.upper() or not _first_visit(sym, seen):
+            continue
+        for iv in _subdirs(sym.path):
+            tf = _norm_interval(iv.name)
+            if tf not in tfs or not _first_visit(iv, seen):
+                continue
+            days = out[tf]
+            for day in _subdirs(iv.path):
+                if day.name.isdigit() and _first_visit(day, seen):
+                    days[day.name].append(day.path)
+    return out
+
+def _layout_candidates(days: Dict[str, List[str]]):
+    """Yield (path, stat) newest first, reading one day directory at a time
+    instead of walking the whole archive."""
+    suffix = _glob_suffix(FILE_GLOB)
+    for day in sorted(days, reverse=True):
+        files = []
+        for d in days[day]:
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        if e.name.endswith(suffix) and not e.name.startswith("."):
+                            try:
+                                st = e.stat()
+                                files.append((-st.st_mtime_ns, e.path, st))
+                            except OSError:
+                                continue
+            except OSError:
+                continue
+        # usually the newest file parses, so heapify (O(n)) and pop lazily
+        # rather than sorting the whole day
+        heapq.heapify(files)
+        while files:
+            _, p, st = heapq.heappop(files)
+            yield p, st
+
 # ---------- CORE ----------
+# Reads release the GIL, so on network or spinning storage a cold miss is bound
+# by per-file latency; overlapping a few of them hides most of it.
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()  # _get_all_tfs runs on several to_thread workers at once
+
+def _pmap(fn, items):
+    global _executor
+    if STAT_THREADS <= 1:
+        return map(fn, items)
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=STAT_THREADS, thread_name_prefix="coinalyze-io")
+    return _executor.map(fn, items)
+
+def _pick_layout(days: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+    for p, st in itertools.islice(_layout_candidates(days), SCAN_LIMIT):
+        core = _parse_flat_file(p, st)
+        if core:
+            return core
+    return None
+
+def _pick_scanned(symbol: str, tfs) -> Dict[str, Any]:
+    """One pass over the newest SCAN_LIMIT files, filling each wanted tf with its
+    newest parseable file and stopping as soon as every tf is filled."""
+    want = set(tfs)
+    out: Dict[str, Any] = {}
+    root = len(DATA_DIR)
+
+    def unwanted(name: str, path: str) -> bool:
+        # skip whole interval folders for timeframes nobody asked for
+        iv = _INTERVAL_MAP.get(name) or _INTERVAL_MAP.get(name.lower())
+        if iv is not None:
+            return iv not in want
+        # and top-level symbol folders (as _symbol_for_dir reads them) of other symbols
+        if len(path) - len(name) - 1 == root:
+            return symbol not in name.upper() and _symbol_for_seg(name) is not None
+        return False
+
+    # match the interval token exactly: a substring test lets "5m" hit "15min";
+    # the symbol is looked for below DATA_DIR only (never in its own name),
+    # in the folders or, for flat logs like flat/BTC_15m.json, the file name.
+    # Files of one day share a directory, so its part is worked out once.
+    dir_ok: Dict[str, tuple] = {}
+
+    def wanted(p: str) -> bool:
+        i = p.rfind(os.sep)
+        d = p[:i]
+        ok = dir_ok.get(d)
+        if ok is None:
+            ok = dir_ok[d] = (_interval_for_dir(d), symbol in d[root:].upper())
+        tf, sym_ok = ok
+        if tf is None:
+            tf = _interval_for_name(p[i + 1:])
+        return tf in want and (sym_ok or symbol in p[i + 1:].upper())
+
+    cands = filter(wanted, _rscan_latest(DATA_DIR, FILE_GLOB, SCAN_LIMIT, prune=unwanted))
+    while want:
+        # parse a window of candidates at once, then consume them newest first
+        batch = list(itertools.islice(cands, max(1, STAT_THREADS)))
+        if not batch:
+            break
+        for p, core in zip(batch, _pmap(_parse_flat_file, batch)):
+            tf = _path_interval(p)
+            if core and tf in want:
+                out[tf] = core
+                want.discard(tf)
+    return out
+
 def _get_latest_for_symbol(symbol: str, tf: str) -> Dict[str, Any]:
     symbol = symbol.upper()
-    tf = tf.lower()
-    for p in _rscan_latest(DATA_DIR, FILE_GLOB, SCAN_LIMIT):
-        if symbol in str(p).upper() and tf in str(p).lower():
-            core = _parse_flat_file(p)
-            if core:
-                return core
-    raise HTTPException(status_code=404, detail=f"No data found for {symbol} {tf}")
+    tf = _norm_interval(tf)
+    core = _pick_layout(_layout_days(symbol, (tf,)).get(tf, {}))
+    if core is None:
+        # not (or not only) laid out by the collector: fall back to the full scan
+        core = _pick_scanned(symbol, (tf,)).get(tf)
+    if core is None:
+        raise HTTPException(status_code=404, detail=f"No data found for {symbol} {tf}")
+    return core
 
 def _get_all_tfs(symbol: str) -> Dict[str, Any]:
+    symbol = symbol.upper()
     tfs = ("1m", "5m", "15m", "1h")
     out = {}
-    for tf in tfs:
-        try:
-            out[tf] = _get_latest_for_symbol(symbol, tf)
-        except HTTPException:
-            continue
+    layout = _layout_days(symbol, tfs)  # one directory walk shared by all four
+    for tf, core in zip(tfs, _pmap(_pick_layout, [layout.get(tf, {}) for tf in tfs])):
+        if core is not None:
+            out[tf] = core
+    missing = [tf for tf in tfs if tf not in out]
+    if missing:
+        # a single shared fallback scan for whatever the layout walk did not find
+        out.update(_pick_scanned(symbol, missing))
     if not out:
         raise HTTPException(status_code=404, detail=f"No data found for {symbol}")
-    return out
+    return {tf: out[tf] for tf in tfs if tf in out}
+
+def _encode(payload: Any):
+    """Serialize once; the bytes and their ETag are cached together. The tag is
+    content-derived, so it moves whenever a newer file (or a rewrite) is served
+    and matches across workers."""
+    body = _json_dumps(payload)
+    return body, 'W/"%08x"' % zlib.crc32(body)
 
 # ---------- ROUTES ----------
 @app.get("/healthz")
-def healthz():
-    return {"status": "ok", "dir": DATA_DIR, "glob": FILE_GLOB}
+async def healthz():
+    return _JSON({"status": "ok", "dir": DATA_DIR, "glob": FILE_GLOB})
 
 @app.get("/v1/files")
-def list_files(n: int = Query(25, ge=1, le=1000)):
-    files = [str(p) for p in _rscan_latest(DATA_DIR, FILE_GLOB, n)]
-    return {"dir": DATA_DIR, "glob": FILE_GLOB, "count": len(files), "files": files}
+async def list_files(n: int = Query(25, ge=1, le=1000)):
+    files = await asyncio.to_thread(_rscan_latest, DATA_DIR, FILE_GLOB, n)
+    return _JSON({"dir": DATA_DIR, "glob": FILE_GLOB, "count": len(files), "files": files})
+
+async def _fill_metrics(symbol: str):
+    version = _fs_version
+    data = await asyncio.to_thread(_get_all_tfs, symbol)
+    hit = _encode({"ok": True, "latest": data})
+    _cache_set(("metrics", symbol), hit, version)
+    return hit
+
+async def _refresh_loop():
+    # Re-fill hot symbols a little before their entries expire, so steady pollers
+    # are served from cache and never wait on a scan themselves.
+    while True:
+        await asyncio.sleep(max(CACHE_TTL_SEC * 0.8, 0.5))
+        now = time.time()
+        for symbol, seen in list(_hot.items()):
+            if now - seen > REFRESH_IDLE_SEC:
+                _hot.pop(symbol, None)
+                continue
+            if _index_live and _cache_get(("metrics", symbol)) is not None:
+                continue  # nothing under DATA_DIR changed since it was filled
+            try:
+                async with _cache_lock(("metrics", symbol)):
+                    await _fill_metrics(symbol)
+            except HTTPException:
+                _hot.pop(symbol, None)  # nothing to serve; the next request will retry
+            except Exception as e:
+                log.warning("Refresh failed for %s: %r", symbol, e)
 
 @app.get("/v1/metrics/{symbol}")
-def metrics_symbol(symbol: str):
-    key = f"metrics:{symbol}"
+async def metrics_symbol(symbol: str, request: Request):
+    symbol = symbol.upper()  # the scan matches uppercase anyway; "btc" and "BTC" share one entry
+    key = ("metrics", symbol)
+    if REFRESH_IDLE_SEC > 0:
+        _hot[symbol] = time.time()
+        _hot.move_to_end(symbol)
+        if len(_hot) > REFRESH_MAX:
+            _hot.popitem(last=False)
     hit = _cache_get(key)
-    if hit: return hit
-    data = _get_all_tfs(symbol)
-    payload = {"ok": True, "latest": data}
-    _cache_set(key, payload)
-    return payload
+    if not hit:
+        async with _cache_lock(key):
+            hit = _cache_get(key)
+            if not hit:
+                hit = await _fill_metrics(symbol)
+    body, etag = hit
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag})
 
 @app.get("/v1/metrics/debug")
-def metrics_debug(symbol: Optional[str] = None, tf: Optional[str] = None):
+async def metrics_debug(symbol: Optional[str] = None, tf: Optional[str] = None):
     try:
         if symbol and tf:
-            return {"ok": True, "picked": _get_latest_for_symbol(symbol, tf)}
+            return _JSON({"ok": True, "picked": await asyncio.to_thread(_get_latest_for_symbol, symbol, tf)})
         elif symbol:
-            return {"ok": True, "picked": _get_all_tfs(symbol)}
+            return _JSON({"ok": True, "picked": await asyncio.to_thread(_get_all_tfs, symbol)})
         else:
-            return {"ok": True, "files": [str(p) for p in _rscan_latest(DATA_DIR, FILE_GLOB, 20)]}
+            files = await asyncio.to_thread(_rscan_latest, DATA_DIR, FILE_GLOB, 20)
+            return _JSON({"ok": True, "files": files})
     except HTTPException as e:
-        return JSONResponse({"detail": e.detail}, status_code=e.status_code)
+        return _JSON({"detail": e.detail}, status_code=e.status_code)
+
+@app.on_event("startup")
+def start_index():
+    global _observer, _index_live, _index_complete
+    if Observer is None or _INDEX_SUFFIX is None or not os.path.isdir(DATA_DIR):
+        return
+    try:
+        _observer = Observer()
+        _observer.schedule(_IndexHandler(), DATA_DIR, recursive=True)
+        _observer.start()  # watch first so nothing written during the bootstrap walk is missed
+        top = heapq.nlargest(INDEX_SIZE, _scandir_recursive(DATA_DIR, _INDEX_SUFFIX))
+    except OSError as e:
+        # e.g. inotify watch limit reached, or an unreadable subdirectory
+        log.warning("File index unavailable, falling back to directory walks: %r", e)
+        stop_index()
+        _observer = None
+        return
+    with _index_lock:
+        for mtime, p in top:
+            _index.setdefault(p, mtime)
+        _index_complete = len(top) < INDEX_SIZE
+    _index_live = True
+    log.info("File index live — %d files tracked under %s", len(_index), DATA_DIR)
+
+@app.on_event("startup")
+async def start_refresher():
+    global _refresher
+    if REFRESH_IDLE_SEC > 0:
+        _refresher = asyncio.create_task(_refresh_loop())
+
+@app.on_event("shutdown")
+async def stop_refresher():
+    if _refresher is not None:
+        _refresher.cancel()
+
+@app.on_event("shutdown")
+def stop_index():
+    global _index_live
+    _index_live = False
+    if _observer is not None:
+        _observer.stop()
+        if _observer.is_alive():
+            _observer.join(timeout=5)
 
 @app.on_event("startup")
 def startup_info():
     log.info("API up — DATA_DIR=%s | GLOB=%s", DATA_DIR, FILE_GLOB)
     log.info("Routes: /healthz, /v1/files, /v1/metrics/{symbol}, /v1/metrics/debug")
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host=os.getenv("HOST", "0.0.0.0"), port=int(os.getenv("PORT", "8000")))
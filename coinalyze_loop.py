@@ -61,6 +61,12 @@ def unwrap_snapshot_value(resp, key="value"):
         return resp.get(key)
     return None
 
+def _first_key(d, keys):
+    for k in keys:
+        if k in d:
+            return k
+    return keys[0]
+
 def compute_cvd_from_ohlcv(ohlcv_bars):
     """
     Coinalyze OHLCV history may include:
@@ -72,18 +78,27 @@ def compute_cvd_from_ohlcv(ohlcv_bars):
     """
     out = []
     cvd = 0.0
+    if not ohlcv_bars:
+        return out
+    # bars of one response share a schema: pick each field's spelling once
+    first = ohlcv_bars[0]
+    tk = _first_key(first, ("timestamp", "ts", "time"))
+    vk = _first_key(first, ("v", "volume"))
+    bk = _first_key(first, ("bv", "buy_volume"))
     for b in ohlcv_bars:
-        ts = b.get("timestamp") or b.get("ts") or b.get("time") or 0
-        v  = b.get("v")  or b.get("volume")
-        bv = b.get("bv") or b.get("buy_volume")
+        ts = b.get(tk) or 0
+        v  = b.get(vk)
+        bv = b.get(bk)
         if v is None or bv is None:
             # Cannot compute true CVD without explicit buy volume
             return []
-        try:
-            v  = float(v)
-            bv = float(bv)
-        except Exception:
-            return []
+        if type(v) is not float or type(bv) is not float:
+            # JSON numbers usually decode straight to float; only convert ints/strings
+            try:
+                v  = float(v)
+                bv = float(bv)
+            except Exception:
+                return []
         sv    = max(v - bv, 0.0)
         delta = bv - sv  # = 2*bv - v
         cvd  += delta
@@ -1,6 +1,12 @@
 import os, json, time, gzip, shutil
 from pathlib import Path
 
+try:
+    import orjson
+    _json_dumps = orjson.dumps  # compact UTF-8 bytes, same as separators=(",", ":"), ensure_ascii=False
+except ImportError:  # stdlib fallback keeps the sink usable without orjson
+    _json_dumps = lambda o: json.dumps(o, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
 DATA_DIR     = os.getenv("DATA_DIR", "/data/coinalyze")
 USE_JSONL    = os.getenv("ENABLE_JSONL", "true").lower() == "true"
 GZIP_JSONL   = os.getenv("GZIP_JSONL", "true").lower() == "true"
@@ -21,8 +27,8 @@ def write_snapshot(symbol, interval, pack):
     pdir = _day_dir(symbol, interval, pack.get("fetched_at"))
     fname = f"{pack['fetched_at']}.json"
     fpath = pdir / fname
-    with open(fpath, "w") as f:
-        json.dump(pack, f, separators=(",", ":"), ensure_ascii=False)
+    with open(fpath, "wb") as f:
+        f.write(_json_dumps(pack))
     return str(fpath)
 
 def append_jsonl(symbol, interval, pack):
@@ -33,15 +39,15 @@ def append_jsonl(symbol, interval, pack):
     if GZIP_JSONL:
         # Write to temp then append gz
         tmp = str(base) + ".tmp"
-        with open(tmp, "a") as f:
-            f.write(json.dumps(pack, separators=(",", ":"), ensure_ascii=False) + "\n")
+        with open(tmp, "ab") as f:
+            f.write(_json_dumps(pack) + b"\n")
         with open(tmp, "rb") as fin, gzip.open(str(base) + ".gz", "ab") as fout:
             shutil.copyfileobj(fin, fout)
         os.remove(tmp)
         return str(base) + ".gz"
     else:
-        with open(base, "a") as f:
-            f.write(json.dumps(pack, separators=(",", ":"), ensure_ascii=False) + "\n")
+        with open(base, "ab") as f:
+            f.write(_json_dumps(pack) + b"\n")
         return path
 
 def retention_cleanup():
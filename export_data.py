@@ -1,6 +1,14 @@
 import os, json, argparse, gzip
 from pathlib import Path
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps  # compact, UTF-8, no ensure_ascii escaping
+except ImportError:  # stdlib fallback keeps the exporter runnable without orjson
+    _json_loads = json.loads
+    _json_dumps = lambda o: json.dumps(o, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
 DATA_DIR = os.getenv("DATA_DIR", "/data/coinalyze")
 
 def export(symbol, interval, date, out_file):
@@ -14,12 +22,14 @@ def export(symbol, interval, date, out_file):
     if not p.exists():
         raise FileNotFoundError(f"No data folder: {p}")
 
-    with open(out_file, "w") as out:
-        for f in sorted(p.glob("*.json")):
+    with open(out_file, "wb") as out:
+        with os.scandir(p) as it:
+            names = sorted(e.name for e in it if e.name.endswith(".json") and not e.name.startswith("."))
+        for f in (p / n for n in names):
             try:
-                with open(f) as fh:
-                    pack = json.load(fh)
-                out.write(json.dumps(pack, separators=(",", ":"), ensure_ascii=False) + "\n")
+                with open(f, "rb") as fh:
+                    pack = _json_loads(fh.read())
+                out.write(_json_dumps(pack) + b"\n")
             except Exception as e:
                 print(f"Error reading {f}: {e}")
 
@@ -2,6 +2,12 @@ import os, json, csv
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # stdlib fallback keeps the builder runnable without orjson
+    _json_loads = json.loads
+
 OUT_ROOT = Path(os.getenv("OUT_ROOT","/data/lake"))
 AN_OUT   = Path(os.getenv("AN_OUT","/data/analytics"))
 
@@ -11,12 +17,12 @@ INTERVAL = os.getenv("INTERVAL","1min")  # For daily VWAP we use 1min
 def read_jsonl(path: Path):
     rows = []
     if not path.exists(): return rows
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "rb") as f:
         for line in f:
             line=line.strip()
             if not line: continue
             try:
-                rows.append(json.loads(line))
+                rows.append(_json_loads(line))
             except Exception:
                 pass
     return rows
@@ -24,15 +30,32 @@ def read_jsonl(path: Path):
 def day_dirs(symbol: str, interval: str):
     root = OUT_ROOT / symbol / interval
     if not root.exists(): return []
-    return sorted([p.name for p in root.iterdir() if p.is_dir()])
+    # DirEntry.is_dir() answers from readdir's d_type, no stat per entry
+    with os.scandir(root) as it:
+        return sorted(e.name for e in it if e.is_dir())
+
+# Candidate column names, long form first; rows of one ohlcv.jsonl share a schema
+_CLOSE_KEYS  = ("close", "c")
+_VOLUME_KEYS = ("volume", "v")
+_HIGH_KEYS   = ("high", "h")
+_LOW_KEYS    = ("low", "l")
+
+def _col(rows, keys):
+    """Resolve which of `keys` this day's rows use, once, from the first row."""
+    first = rows[0] if rows else {}
+    for k in keys:
+        if k in first:
+            return k
+    return keys[0]
 
 def vwap_of_day(ohlcv_rows):
     # Expect rows with 'open','high','low','close','volume' and maybe 'v','bv'
     # Tolerate keys: o/h/l/c/v OR open/high/low/close/volume
     cum_pv, cum_v = 0.0, 0.0
+    ck, vk = _col(ohlcv_rows, _CLOSE_KEYS), _col(ohlcv_rows, _VOLUME_KEYS)
     for r in ohlcv_rows:
-        p = r.get("close", r.get("c"))
-        v = r.get("volume", r.get("v"))
+        p = r.get(ck)
+        v = r.get(vk)
         if p is None or v is None: continue
         p = float(p); v = float(v)
         cum_pv += p * v
@@ -40,9 +63,10 @@ def vwap_of_day(ohlcv_rows):
     return (cum_pv / cum_v) if cum_v > 0 else None
 
 def touched_today(level: float, ohlcv_rows) -> bool:
+    hk, lk = _col(ohlcv_rows, _HIGH_KEYS), _col(ohlcv_rows, _LOW_KEYS)
     for r in ohlcv_rows:
-        hi = float(r.get("high", r.get("h")))
-        lo = float(r.get("low",  r.get("l")))
+        hi = float(r.get(hk))
+        lo = float(r.get(lk))
         if lo <= level <= hi:
             return True
     return False
@@ -50,9 +74,10 @@ def touched_today(level: float, ohlcv_rows) -> bool:
 def first_touch_reaction(level: float, ohlcv_rows, lookahead=120):
     # returns max excursion in bps away from level after the first touch within lookahead bars
     first_idx = None
+    hk, lk, ck = _col(ohlcv_rows, _HIGH_KEYS), _col(ohlcv_rows, _LOW_KEYS), _col(ohlcv_rows, _CLOSE_KEYS)
     for i, r in enumerate(ohlcv_rows):
-        hi = float(r.get("high", r.get("h")))
-        lo = float(r.get("low",  r.get("l")))
+        hi = float(r.get(hk))
+        lo = float(r.get(lk))
         if lo <= level <= hi:
             first_idx = i
             break
@@ -61,7 +86,7 @@ def first_touch_reaction(level: float, ohlcv_rows, lookahead=120):
     mx, mn = -1e9, 1e9
     end = min(len(ohlcv_rows), first_idx + lookahead)
     for j in range(first_idx, end):
-        c = float(ohlcv_rows[j].get("close", ohlcv_rows[j].get("c")))
+        c = float(ohlcv_rows[j].get(ck))
         mx = max(mx, c)
         mn = min(mn, c)
     up_bps   = (mx/level - 1.0) * 10000.0